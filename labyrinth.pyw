@@ -0,0 +1,11 @@
+"""
+Labyrinth Enterprise - Launcher
+Python compiles the script it is started with on every launch, but loads
+imported modules from cached bytecode. Starting through this stub keeps
+labyrinth_enterprise.py on the fast path.
+"""
+
+import labyrinth_enterprise
+
+if __name__ == "__main__":
+    labyrinth_enterprise.main()
@@ -0,0 +1,578 @@
+"""
+Labyrinth Enterprise - Benchmarks
+Throughput and latency of the encryption paths, measured offline against
+scratch folders. Results can be saved as named baselines and later runs
+compared against them:
+
+    python labyrinth_bench.py --save main
+    python labyrinth_bench.py --compare main    # exits 1 on a regression
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+from dataclasses import dataclass, asdict, replace
+
+import labyrinth_enterprise as labyrinth
+from labyrinth_enterprise import (
+    LabyrinthConfig,
+    AuditLogger,
+    EncryptionHandler,
+    DecryptionHandler,
+    EventCoalescer,
+    FileIndex,
+    WorkerPool,
+    crypto
+)
+
+BASELINE_DIR = Path.home() / ".labyrinth" / "benchmarks"
+DEFAULT_THRESHOLD_PERCENT = 10.0
+
+KB = 1024
+MB = 1024 * KB
+GB = 1024 * MB
+
+# Sizes and counts per profile; "full" takes minutes and needs ~3 GB of disk
+PROFILES = {
+    'quick': {
+        'sizes': [KB, 64 * KB, MB, 16 * MB],
+        'storm_files': 500,
+        'all_mode_files': [100, 1000],
+        'filter_paths': 100_000,
+        'audit_files': 500,
+        'latency_events': 200,
+        'latency_rate': 200.0
+    },
+    'full': {
+        'sizes': [KB, 64 * KB, MB, 16 * MB, 256 * MB, GB],
+        'storm_files': 5000,
+        'all_mode_files': [100, 1000, 10_000],
+        'filter_paths': 1_000_000,
+        'audit_files': 5000,
+        'latency_events': 2000,
+        'latency_rate': 500.0
+    }
+}
+
+BENCHMARKS = ("throughput", "storm", "filter", "all-mode", "audit", "latency")
+
+
+@dataclass
+class Metric:
+    """One number from a benchmark run"""
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool = True
+
+
+def size_label(size: int) -> str:
+    for unit, factor in (("GB", GB), ("MB", MB), ("KB", KB)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return f"{size}B"
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class NullAuditLogger:
+    """Stands in for AuditLogger when audit cost is not being measured"""
+    
+    def log_event(self, event_type: str, details: Dict[str, Any]):
+        pass
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return True
+    
+    def close(self):
+        pass
+
+
+class BenchContext:
+    """Scratch config_dir, a throwaway key and handler factories"""
+    
+    def __init__(self, workdir: Optional[str], cipher: str, compression: str, workers: int):
+        self.root = Path(tempfile.mkdtemp(prefix="labyrinth-bench-", dir=workdir))
+        self.config = LabyrinthConfig(
+            config_dir=str(self.root / "config"),
+            compression=compression,
+            worker_threads=workers,
+            max_file_size_mb=0
+        )
+        self.cipher = cipher
+        self.key = crypto.Fernet.generate_key()
+        self._folders = 0
+    
+    def folder(self, name: str) -> Path:
+        """A fresh, empty directory under the scratch root"""
+        self._folders += 1
+        path = self.root / f"{self._folders:03d}-{name}"
+        path.mkdir()
+        return path
+    
+    def encryptor(self, directory: Path, audit_logger=None, **kwargs) -> EncryptionHandler:
+        return EncryptionHandler(
+            key=self.key,
+            trigger=kwargs.pop('trigger', "Create"),
+            mode=kwargs.pop('mode', "Individual"),
+            directory=str(directory),
+            groups=kwargs.pop('groups', []),
+            audit_logger=audit_logger or NullAuditLogger(),
+            config=kwargs.pop('config', self.config),
+            cipher=self.cipher,
+            **kwargs
+        )
+    
+    def decryptor(self, directory: Path, audit_logger=None) -> DecryptionHandler:
+        return DecryptionHandler(
+            key=self.key,
+            trigger="Create",
+            mode="Individual",
+            directory=str(directory),
+            groups=[],
+            audit_logger=audit_logger or NullAuditLogger(),
+            config=self.config,
+            cipher=self.cipher
+        )
+    
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def write_file(path: Path, size: int):
+    """Incompressible content, written a megabyte at a time"""
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining:
+            block = min(remaining, MB)
+            f.write(os.urandom(block))
+            remaining -= block
+
+
+def write_files(directory: Path, count: int, size: int, prefix: str = "file") -> List[str]:
+    content = os.urandom(size)
+    paths = []
+    for i in range(count):
+        path = directory / f"{prefix}-{i:06d}.txt"
+        path.write_bytes(content)
+        paths.append(str(path))
+    return paths
+
+
+# ============================================================================
+# BENCHMARKS
+# ============================================================================
+
+def bench_throughput(ctx: BenchContext, sizes: List[int]) -> List[Metric]:
+    """encrypt_file and decrypt_file MB/s at each file size"""
+    metrics = []
+    for size in sizes:
+        # Enough files to run for a while at small sizes; one is plenty for large
+        count = max(1, min(200, (64 * MB) // size))
+        directory = ctx.folder(f"throughput-{size_label(size)}")
+        paths = [str(directory / f"file-{i:04d}.bin") for i in range(count)]
+        for path in paths:
+            write_file(Path(path), size)
+        
+        encryptor = ctx.encryptor(directory)
+        started = time.perf_counter()
+        for path in paths:
+            encryptor.encrypt_file(path, offload=False)
+        encrypt_seconds = time.perf_counter() - started
+        
+        decryptor = ctx.decryptor(directory)
+        started = time.perf_counter()
+        for path in paths:
+            decryptor.decrypt_file(path + ".encrypted")
+        decrypt_seconds = time.perf_counter() - started
+        
+        shutil.rmtree(directory)
+        total_mb = size * count / MB
+        label = size_label(size)
+        metrics.append(Metric(f"encrypt_mb_s@{label}", total_mb / encrypt_seconds, "MB/s"))
+        metrics.append(Metric(f"decrypt_mb_s@{label}", total_mb / decrypt_seconds, "MB/s"))
+    return metrics
+
+
+def bench_storm(ctx: BenchContext, count: int, size: int = 4 * KB) -> List[Metric]:
+    """Small files pushed through handle_file on the worker pool"""
+    directory = ctx.folder("storm")
+    paths = write_files(directory, count, size)
+    file_index = FileIndex(ctx.root / "storm-index.db")
+    pool = WorkerPool(ctx.config.worker_threads, ctx.config.worker_queue_size)
+    encryptor = ctx.encryptor(directory, worker_pool=pool, file_index=file_index)
+    
+    started = time.perf_counter()
+    for path in paths:
+        encryptor.dispatch_file(path)
+    pool.drain()
+    elapsed = time.perf_counter() - started
+    
+    pool.shutdown()
+    file_index.close()
+    shutil.rmtree(directory)
+    return [Metric(f"storm_files_s@{size_label(size)}", count / elapsed, "files/s")]
+
+
+def bench_filter(ctx: BenchContext, count: int) -> List[Metric]:
+    """accepts() on a realistic mix of paths, with extension and glob rules"""
+    directory = ctx.folder("filter")
+    config = replace(
+        ctx.config,
+        allowed_extensions=[".docx", ".xlsx", ".pdf", ".txt"],
+        include_patterns=["Projects/**", "Finance/**"],
+        exclude_patterns=["**/node_modules/**", "**/*.tmp", "**/~$*"]
+    )
+    encryptor = ctx.encryptor(directory, config=config)
+    grouped = ctx.encryptor(
+        directory,
+        config=config,
+        mode="Group",
+        groups=["Finance/Reports", "Projects/Alpha"]
+    )
+    
+    names = ["report.docx", "budget.xlsx", "scan.pdf", "notes.txt", "~$report.docx",
+             "build.tmp", "photo.jpg", "index.js"]
+    folders = ["Projects/Alpha", "Projects/Beta/node_modules/lib", "Finance/Reports/2024",
+               "Downloads", "Projects/Alpha/drafts/old"]
+    paths = [
+        os.path.join(str(directory), folders[i % len(folders)], f"{i}-{names[i % len(names)]}")
+        for i in range(count)
+    ]
+    
+    metrics = []
+    for label, handler in (("individual", encryptor), ("group", grouped)):
+        started = time.perf_counter()
+        for path in paths:
+            handler.accepts(path)
+        elapsed = time.perf_counter() - started
+        metrics.append(Metric(f"filter_paths_s@{label}", count / elapsed, "paths/s"))
+    return metrics
+
+
+def bench_all_mode(ctx: BenchContext, counts: List[int], size: int = 4 * KB) -> List[Metric]:
+    """"All" mode: the startup sweep, then one new file after the manifest is built"""
+    metrics = []
+    for count in counts:
+        directory = ctx.folder(f"all-{count}")
+        # Spread over subfolders, as real trees are
+        for i in range(0, count, 100):
+            subfolder = directory / f"dir-{i // 100:04d}"
+            subfolder.mkdir()
+            write_files(subfolder, min(100, count - i), size)
+        
+        encryptor = ctx.encryptor(directory, mode="All")
+        started = time.perf_counter()
+        encryptor.encrypt_all_files(startup=True)
+        sweep_seconds = time.perf_counter() - started
+        
+        new_files = write_files(directory, 20, size, prefix="new")
+        started = time.perf_counter()
+        for path in new_files:
+            encryptor.handle_file(path)
+        incremental_ms = (time.perf_counter() - started) * 1000 / len(new_files)
+        
+        encryptor.close()
+        shutil.rmtree(directory)
+        metrics.append(Metric(f"all_sweep_files_s@{count}", count / sweep_seconds, "files/s"))
+        metrics.append(Metric(f"all_new_file_ms@{count}", incremental_ms, "ms", False))
+    return metrics
+
+
+def bench_audit(ctx: BenchContext, count: int, size: int = 4 * KB) -> List[Metric]:
+    """Per-file cost of audit logging, and raw log_event throughput"""
+    seconds = {}
+    audit_logger = AuditLogger(ctx.config)
+    for label, logger in (("none", NullAuditLogger()), ("audit", audit_logger)):
+        directory = ctx.folder(f"audit-{label}")
+        paths = write_files(directory, count, size)
+        encryptor = ctx.encryptor(directory, audit_logger=logger)
+        started = time.perf_counter()
+        for path in paths:
+            encryptor.encrypt_file(path, offload=False)
+        logger.flush()
+        seconds[label] = time.perf_counter() - started
+        shutil.rmtree(directory)
+    
+    events = count * 20
+    started = time.perf_counter()
+    for i in range(events):
+        audit_logger.log_event('benchmark', {'file_path': f"/bench/{i}.txt", 'size_bytes': size})
+    audit_logger.flush()
+    events_seconds = time.perf_counter() - started
+    audit_logger.close()
+    
+    overhead_us = max(0.0, seconds['audit'] - seconds['none']) * 1_000_000 / count
+    return [
+        Metric("audit_overhead_us_per_file", overhead_us, "us", False),
+        Metric("audit_events_s", events / events_seconds, "events/s")
+    ]
+
+
+class _SyntheticEvent:
+    """The attributes of a watchdog FileCreatedEvent the handlers read"""
+    is_directory = False
+    
+    def __init__(self, src_path: str):
+        self.src_path = src_path
+
+
+def bench_latency(
+    ctx: BenchContext,
+    count: int,
+    rate: float,
+    quiesce: float = 0.0,
+    size: int = 4 * KB
+) -> List[Metric]:
+    """Event-to-encrypted latency through on_created, the pool and encrypt_file.
+    
+    A synthetic source writes a file and delivers its create event at a
+    steady rate, standing in for the observer so the numbers do not depend
+    on the platform's notification backend.
+    """
+    directory = ctx.folder("latency")
+    content = os.urandom(size)
+    sent: Dict[str, float] = {}
+    done: Dict[str, float] = {}
+    finished = threading.Event()
+    lock = threading.Lock()
+    
+    def on_status(message: str):
+        name = message.split(": ", 1)[1]
+        with lock:
+            done[name] = time.perf_counter()
+            if len(done) == count:
+                finished.set()
+    
+    pool = WorkerPool(ctx.config.worker_threads, ctx.config.worker_queue_size)
+    coalescer = EventCoalescer(quiesce, max(quiesce, 1.0)) if quiesce > 0 else None
+    encryptor = ctx.encryptor(
+        directory,
+        status_callback=on_status,
+        worker_pool=pool,
+        coalescer=coalescer
+    )
+    
+    interval = 1.0 / rate
+    started = time.perf_counter()
+    for i in range(count):
+        name = f"event-{i:06d}.txt"
+        path = directory / name
+        path.write_bytes(content)
+        sent[name] = time.perf_counter()
+        encryptor.on_created(_SyntheticEvent(str(path)))
+        delay = started + (i + 1) * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    
+    finished.wait(timeout=60 + quiesce * 4)
+    if coalescer:
+        coalescer.stop(flush=False)
+    pool.shutdown()
+    shutil.rmtree(directory)
+    
+    latencies = [(done[name] - sent[name]) * 1000 for name in done]
+    if len(latencies) < count:
+        logging.warning(f"Latency run timed out: {len(latencies)}/{count} files encrypted")
+    return [
+        Metric("latency_ms@p50", percentile(latencies, 50), "ms", False),
+        Metric("latency_ms@p95", percentile(latencies, 95), "ms", False),
+        Metric("latency_ms@p99", percentile(latencies, 99), "ms", False)
+    ]
+
+
+def run_suite(
+    profile: str = "quick",
+    only: Optional[List[str]] = None,
+    cipher: str = "aes-256-gcm",
+    compression: str = "none",
+    workers: int = 0,
+    quiesce: float = 0.0,
+    workdir: Optional[str] = None,
+    progress=None
+) -> Dict[str, Any]:
+    """Run the selected benchmarks and return a baseline-shaped result"""
+    settings = PROFILES[profile]
+    selected = only or list(BENCHMARKS)
+    ctx = BenchContext(workdir, cipher, compression, workers)
+    runners = {
+        'throughput': lambda: bench_throughput(ctx, settings['sizes']),
+        'storm': lambda: bench_storm(ctx, settings['storm_files']),
+        'filter': lambda: bench_filter(ctx, settings['filter_paths']),
+        'all-mode': lambda: bench_all_mode(ctx, settings['all_mode_files']),
+        'audit': lambda: bench_audit(ctx, settings['audit_files']),
+        'latency': lambda: bench_latency(
+            ctx, settings['latency_events'], settings['latency_rate'], quiesce
+        )
+    }
+    
+    metrics: List[Metric] = []
+    try:
+        for name in BENCHMARKS:
+            if name not in selected:
+                continue
+            if progress:
+                progress(f"Running {name}...")
+            metrics.extend(runners[name]())
+    finally:
+        ctx.close()
+    
+    return {
+        'created': time.time(),
+        'version': LabyrinthConfig.version,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'profile': profile,
+        'cipher': cipher,
+        'compression': compression,
+        'workers': ctx.config.worker_threads or os.cpu_count(),
+        'metrics': {metric.name: asdict(metric) for metric in metrics}
+    }
+
+
+# ============================================================================
+# BASELINES
+# ============================================================================
+
+def baseline_path(name: str, baseline_dir: Path = BASELINE_DIR) -> Path:
+    return Path(baseline_dir) / f"{name}.json"
+
+
+def save_baseline(result: Dict[str, Any], name: str, baseline_dir: Path = BASELINE_DIR) -> Path:
+    path = baseline_path(name, baseline_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(f"{path}.tmp")
+    tmp_path.write_text(json.dumps(result, indent=2), encoding='utf-8')
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_baseline(name: str, baseline_dir: Path = BASELINE_DIR) -> Dict[str, Any]:
+    path = baseline_path(name, baseline_dir)
+    if not path.exists():
+        # A path to a result saved elsewhere works too
+        path = Path(name)
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def compare(
+    baseline: Dict[str, Any],
+    result: Dict[str, Any],
+    threshold_percent: float = DEFAULT_THRESHOLD_PERCENT
+) -> List[Dict[str, Any]]:
+    """Per-metric change against a baseline; 'regressed' when worse than the threshold"""
+    rows = []
+    for name, metric in result['metrics'].items():
+        before = baseline['metrics'].get(name)
+        row = {'name': name, 'unit': metric['unit'], 'value': metric['value'],
+               'baseline': None, 'change_percent': None, 'regressed': False}
+        if before and before['value']:
+            change = (metric['value'] - before['value']) / before['value'] * 100
+            worse = -change if metric['higher_is_better'] else change
+            row.update(
+                baseline=before['value'],
+                change_percent=change,
+                regressed=worse > threshold_percent
+            )
+        rows.append(row)
+    return rows
+
+
+def format_report(rows: List[Dict[str, Any]]) -> str:
+    width = max([len(row['name']) for row in rows] + [6])
+    lines = [f"{'metric':<{width}}  {'value':>18}  {'baseline':>12}  {'change':>8}"]
+    for row in rows:
+        baseline = "-" if row['baseline'] is None else f"{row['baseline']:.2f}"
+        change = "-" if row['change_percent'] is None else f"{row['change_percent']:+.1f}%"
+        flag = "  REGRESSED" if row['regressed'] else ""
+        value = f"{row['value']:.2f} {row['unit']}"
+        lines.append(f"{row['name']:<{width}}  {value:>18}  {baseline:>12}  {change:>8}{flag}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog="labyrinth_bench.py",
+        description="Benchmark Labyrinth's encryption paths and compare against a baseline"
+    )
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick",
+                        help="quick (seconds) or full (1 KB to 1 GB files, minutes)")
+    parser.add_argument("--only", action="append", choices=BENCHMARKS,
+                        help="run just this benchmark; repeatable")
+    parser.add_argument("--cipher", choices=sorted(labyrinth.CIPHER_IDS), default="aes-256-gcm")
+    parser.add_argument("--compression", choices=("none", "zlib", "lzma"), default="none")
+    parser.add_argument("--workers", type=int, default=0, help="worker threads; 0 = one per CPU")
+    parser.add_argument("--quiesce", type=float, default=0.0,
+                        help="event coalescing quiet period for the latency run, seconds")
+    parser.add_argument("--workdir", help="where scratch files go (default: system temp)")
+    parser.add_argument("--save", metavar="NAME", help="store the result as a baseline")
+    parser.add_argument("--compare", metavar="NAME", help="baseline name or path to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD_PERCENT,
+                        help="percent a metric may worsen before it counts as a regression")
+    parser.add_argument("--baseline-dir", default=str(BASELINE_DIR))
+    parser.add_argument("--json", action="store_true", help="print the raw result as JSON")
+    args = parser.parse_args(argv)
+    
+    baseline = None
+    if args.compare:
+        try:
+            baseline = load_baseline(args.compare, Path(args.baseline_dir))
+        except (OSError, ValueError) as e:
+            print(f"Cannot read baseline {args.compare}: {e}", file=sys.stderr)
+            return 2
+    
+    result = run_suite(
+        profile=args.profile,
+        only=args.only,
+        cipher=args.cipher,
+        compression=args.compression,
+        workers=args.workers,
+        quiesce=args.quiesce,
+        workdir=args.workdir,
+        progress=lambda message: print(message, file=sys.stderr)
+    )
+    
+    rows = compare(baseline or {'metrics': {}}, result, args.threshold)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(format_report(rows))
+    
+    if args.save:
+        path = save_baseline(result, args.save, Path(args.baseline_dir))
+        print(f"Saved baseline to {path}", file=sys.stderr)
+    
+    if baseline is None:
+        return 0
+    for key in ('profile', 'cipher', 'compression', 'cpus'):
+        if baseline.get(key) != result.get(key):
+            print(f"Note: baseline {key} was {baseline.get(key)}, now {result.get(key)}",
+                  file=sys.stderr)
+    regressed = [row['name'] for row in rows if row['regressed']]
+    if regressed:
+        print(f"{len(regressed)} regression(s) beyond {args.threshold:.0f}%: "
+              f"{', '.join(regressed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,8 +19,10 @@ if %errorlevel% neq 0 (
     exit /b 1
 )
 
-REM Launch Labyrinth (hidden console)
-start /B pythonw labyrinth_enterprise.py
+REM Launch Labyrinth (hidden console) through the stub, which loads the
+REM application from cached bytecode instead of recompiling it
+cd /d "%~dp0"
+start /B pythonw labyrinth.pyw
 
 REM Exit immediately (don't keep console open)
 exit
\ No newline at end of file
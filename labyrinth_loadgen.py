@@ -0,0 +1,523 @@
+"""
+Labyrinth Enterprise - Load Generator
+Reproduces file storms, like a sync client dumping thousands of files into
+a protected folder, and reports how protection keeps up: throughput,
+backlog depth, plaintext latency percentiles and peak memory.
+
+    python labyrinth_loadgen.py --files 50000 --rate 2000
+    python labyrinth_loadgen.py --target handlers --partial 0.2
+    python labyrinth_loadgen.py --folder ~/Documents/Protected   # a running service
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+from dataclasses import dataclass, asdict
+from concurrent.futures import ThreadPoolExecutor
+
+from labyrinth_enterprise import (
+    LabyrinthConfig,
+    ProtectionEngine,
+    DaemonClient,
+    EncryptionHandler,
+    EventCoalescer,
+    WorkerPool,
+    crypto,
+    format_size
+)
+from labyrinth_bench import NullAuditLogger, percentile, KB, MB, GB
+
+TARGETS = ("engine", "handlers", "folder")
+EXTENSIONS = (".txt", ".docx", ".xlsx", ".pdf", ".csv")
+SAMPLE_INTERVAL = 0.1  # seconds between backlog samples
+POLL_INTERVAL = 0.05  # completion polling for a folder watched by another process
+
+
+def parse_size(value: str) -> int:
+    """'4KB', '10MB', '1GB' or plain bytes"""
+    text = value.strip().upper()
+    for unit, factor in (("GB", GB), ("MB", MB), ("KB", KB), ("B", 1)):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def peak_rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Peak resident memory of this process, or of pid where /proc allows"""
+    status = Path(f"/proc/{pid or 'self'}/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    if pid:
+        return None
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+
+    try:
+        import ctypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                    "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                    "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage"
+                )
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (ImportError, AttributeError, OSError):
+        pass
+    return None
+
+
+@dataclass
+class StormSpec:
+    """What to write, and how"""
+    files: int = 1000
+    rate: float = 0.0  # files started per second; 0 = as fast as possible
+    min_size: int = 1 * KB
+    max_size: int = 256 * KB
+    depth: int = 2  # subfolder levels below the storm root
+    fanout: int = 4  # subfolders per level
+    partial: float = 0.0  # share of files written in several chunks
+    chunks: int = 3
+    chunk_delay: float = 0.2  # seconds between chunks of a partial write
+    rename: float = 0.0  # share of files written under a temporary name, then renamed
+    writers: int = 32  # concurrent writer threads; partial writes hold one while they wait
+    seed: int = 0
+
+
+@dataclass
+class _PlannedFile:
+    path: str
+    size: int
+    partial: bool
+    rename: bool
+
+
+class _Event:
+    """The attributes of a watchdog event the handlers read"""
+    is_directory = False
+
+    def __init__(self, src_path: str, dest_path: str = ""):
+        self.src_path = src_path
+        self.dest_path = dest_path
+
+
+class StormGenerator:
+    """Writes a planned storm into root at the requested rate.
+
+    Every file gets a unique name, so completions reported by name can be
+    matched back to it. When sink is set (a handler driven without an
+    observer), the events a watcher would see are delivered to it directly.
+    """
+
+    def __init__(self, root: Path, spec: StormSpec, sink=None, on_ready=None):
+        self.root = Path(root)
+        self.spec = spec
+        self.sink = sink
+        self.on_ready = on_ready
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.plan = self._plan()
+        self.bytes_written = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._block = os.urandom(MB)
+
+    def _plan(self) -> List[_PlannedFile]:
+        rng = random.Random(self.spec.seed)
+        spec = self.spec
+        folders = [""]
+        for level in range(spec.depth):
+            folders = [
+                os.path.join(parent, f"d{level}-{branch}")
+                for parent in folders for branch in range(spec.fanout)
+            ]
+
+        low, high = max(spec.min_size, 1), max(spec.max_size, spec.min_size, 1)
+        plan = []
+        for i in range(spec.files):
+            # Log-uniform, so a 1KB..1GB range is mostly small files, as real trees are
+            size = int(round(low * (high / low) ** rng.random()))
+            name = f"f{i:06d}{rng.choice(EXTENSIONS)}"
+            plan.append(_PlannedFile(
+                path=str(self.root / rng.choice(folders) / name),
+                size=size,
+                partial=rng.random() < spec.partial,
+                rename=rng.random() < spec.rename
+            ))
+        return plan
+
+    def run(self) -> float:
+        """Write everything; returns the seconds it took"""
+        for folder in {os.path.dirname(item.path) for item in self.plan}:
+            os.makedirs(folder, exist_ok=True)
+
+        interval = 1.0 / self.spec.rate if self.spec.rate > 0 else 0.0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.spec.writers, thread_name_prefix="loadgen-writer") as pool:
+            for i, item in enumerate(self.plan):
+                pool.submit(self._write, item)
+                delay = started + (i + 1) * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        return time.perf_counter() - started
+
+    def _write(self, item: _PlannedFile):
+        target = item.path + ".part" if item.rename else item.path
+        try:
+            chunks = self.spec.chunks if item.partial else 1
+            step = -(-item.size // chunks)
+            with open(target, 'wb') as f:
+                self._emit('on_created', target)
+                for index, offset in enumerate(range(0, item.size, step)):
+                    if index:
+                        time.sleep(self.spec.chunk_delay)
+                    self._fill(f, min(step, item.size - offset))
+                    f.flush()
+                    self._emit('on_modified', target)
+            if item.rename:
+                os.replace(target, item.path)
+                self._emit('on_moved', target, item.path)
+        except OSError as e:
+            # Expected when protection grabs a file mid-write on Windows
+            self.logger.debug(f"Write failed for {target}: {e}")
+            with self._lock:
+                self.errors += 1
+            return
+
+        with self._lock:
+            self.bytes_written += item.size
+        if self.on_ready:
+            self.on_ready(item.path)
+
+    def _fill(self, f, size: int):
+        while size > 0:
+            piece = min(size, len(self._block))
+            f.write(self._block[:piece])
+            size -= piece
+
+    def _emit(self, method: str, *paths: str):
+        if self.sink:
+            getattr(self.sink, method)(_Event(*paths))
+
+
+class StormMonitor:
+    """Tracks when each file became ready and when it was encrypted.
+
+    Completions arrive either as 'Encrypted: <name>' status messages (an
+    in-process target) or by polling for the .encrypted twin (a folder
+    watched by another process). A sampler thread records backlog depth.
+    """
+
+    def __init__(self, backlog_fn=None, poll: bool = False):
+        self.backlog_fn = backlog_fn
+        self.poll = poll
+        self.ready: Dict[str, float] = {}
+        self.done: Dict[str, float] = {}
+        self.early = 0  # encrypted before the writer finished with it
+        self.outstanding_samples: List[int] = []
+        self.backlog_samples: List[int] = []
+        self._by_name: Dict[str, str] = {}
+        self._pending: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._sample, daemon=True)]
+        if poll:
+            self._threads.append(threading.Thread(target=self._poll, daemon=True))
+
+    def start(self, plan: List[_PlannedFile]):
+        self._by_name = {os.path.basename(item.path): item.path for item in plan}
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def mark_ready(self, path: str):
+        with self._lock:
+            self.ready[path] = time.perf_counter()
+            if path not in self.done:
+                self._pending[path] = self.ready[path]
+
+    def status(self, message: str):
+        """status_callback for in-process targets"""
+        if not message.startswith("Encrypted: "):
+            return
+        path = self._by_name.get(message[len("Encrypted: "):])
+        if path:
+            self._complete(path, time.perf_counter())
+
+    def wait(self, expected: int, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if len(self.done) >= expected:
+                    return True
+            time.sleep(POLL_INTERVAL)
+        return False
+
+    def _complete(self, path: str, now: float):
+        with self._lock:
+            if path in self.done:
+                return
+            self.done[path] = now
+            self._pending.pop(path, None)
+            if path not in self.ready:
+                self.early += 1
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            with self._lock:
+                self.outstanding_samples.append(len(self._pending))
+            if self.backlog_fn:
+                try:
+                    self.backlog_samples.append(self.backlog_fn())
+                except Exception as e:
+                    logging.getLogger(self.__class__.__name__).debug(f"Backlog sample failed: {e}")
+
+    def _poll(self):
+        while not self._stop.wait(POLL_INTERVAL):
+            with self._lock:
+                pending = list(self._pending)
+            for path in pending:
+                if os.path.exists(path + ".encrypted") and not os.path.exists(path):
+                    self._complete(path, time.perf_counter())
+
+
+def _scratch_config(root: Path, args) -> LabyrinthConfig:
+    return LabyrinthConfig(
+        config_dir=str(root / "config"),
+        worker_threads=args.workers,
+        quiesce_min_seconds=args.quiesce,
+        crypto_backend=args.backend,
+        default_cipher=args.cipher,
+        max_file_size_mb=0
+    )
+
+
+def run_storm(args, spec: StormSpec) -> Dict[str, Any]:
+    """Set up the target, write the storm, wait for it to settle and summarise"""
+    scratch = Path(tempfile.mkdtemp(prefix="labyrinth-loadgen-", dir=args.workdir))
+    cleanup = []
+    engine = pool = coalescer = client = None
+    memory_pid = None
+
+    if args.target == "folder":
+        storm_root = Path(args.folder).expanduser().resolve() / f"loadgen-{int(time.time())}"
+        storm_root.mkdir(parents=True)
+        client = DaemonClient.connect(LabyrinthConfig.load_from_file(args.config))
+        if client:
+            memory_pid = client.status()['pid']
+        monitor = StormMonitor(
+            backlog_fn=(lambda: client.status()['backlog']) if client else None,
+            poll=True
+        )
+        generator = StormGenerator(storm_root, spec, on_ready=monitor.mark_ready)
+
+    elif args.target == "engine":
+        storm_root = scratch / "storm"
+        storm_root.mkdir()
+        monitor = StormMonitor()
+        engine = ProtectionEngine(_scratch_config(scratch, args), status_callback=monitor.status)
+        engine.open()
+        engine.start_folder(str(storm_root))
+        monitor.backlog_fn = lambda: (
+            (engine.worker_pool.backlog if engine.worker_pool else 0)
+            + (engine.coalescer.pending if engine.coalescer else 0)
+        )
+        cleanup.append(engine.close)
+        generator = StormGenerator(storm_root, spec, on_ready=monitor.mark_ready)
+
+    else:
+        storm_root = scratch / "storm"
+        storm_root.mkdir()
+        config = _scratch_config(scratch, args)
+        pool = WorkerPool(config.worker_threads, config.worker_queue_size)
+        if config.quiesce_min_seconds > 0:
+            coalescer = EventCoalescer(config.quiesce_min_seconds, config.quiesce_max_seconds)
+        monitor = StormMonitor(
+            backlog_fn=lambda: pool.backlog + (coalescer.pending if coalescer else 0)
+        )
+        handler = EncryptionHandler(
+            key=crypto.Fernet.generate_key(),
+            trigger="Create",
+            mode="Individual",
+            directory=str(storm_root),
+            groups=[],
+            audit_logger=NullAuditLogger(),
+            config=config,
+            status_callback=monitor.status,
+            worker_pool=pool,
+            coalescer=coalescer,
+            cipher=args.cipher
+        )
+        cleanup.append(lambda: pool.shutdown(drain=False))
+        if coalescer:
+            cleanup.append(lambda: coalescer.stop(flush=False))
+        generator = StormGenerator(storm_root, spec, sink=handler, on_ready=monitor.mark_ready)
+
+    started = time.perf_counter()
+    monitor.start(generator.plan)
+    write_seconds = generator.run()
+    written = len(generator.plan) - generator.errors
+    settled = monitor.wait(written, args.settle_timeout)
+    monitor.stop()
+
+    for step in reversed(cleanup):
+        step()
+    if not args.keep:
+        shutil.rmtree(storm_root, ignore_errors=True)
+    shutil.rmtree(scratch, ignore_errors=True)
+
+    latencies = [
+        (monitor.done[path] - monitor.ready[path]) * 1000
+        for path in monitor.done if path in monitor.ready
+    ]
+    finished = max(monitor.done.values(), default=started)
+    elapsed = max(finished - started, write_seconds, 1e-9)
+    return {
+        'target': args.target,
+        'spec': asdict(spec),
+        'files_written': written,
+        'write_errors': generator.errors,
+        'bytes_written': generator.bytes_written,
+        'write_seconds': write_seconds,
+        'write_rate': written / write_seconds if write_seconds else 0.0,
+        'encrypted': len(monitor.done),
+        'unprotected': written - len([p for p in monitor.done if p in monitor.ready]),
+        'encrypted_mid_write': monitor.early,
+        'settled': settled,
+        'files_per_second': len(monitor.done) / elapsed,
+        'mb_per_second': generator.bytes_written / MB / elapsed,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies, default=0.0)
+        },
+        'outstanding_peak': max(monitor.outstanding_samples, default=0),
+        'backlog_peak': max(monitor.backlog_samples, default=None),
+        'backlog_mean': (
+            sum(monitor.backlog_samples) / len(monitor.backlog_samples)
+            if monitor.backlog_samples else None
+        ),
+        'peak_rss_bytes': peak_rss_bytes(memory_pid),
+        'memory_of': f"pid {memory_pid}" if memory_pid else "this process"
+    }
+
+
+def format_report(result: Dict[str, Any]) -> str:
+    latency = result['latency_ms']
+    peak_rss = result['peak_rss_bytes']
+    lines = [
+        f"Target:        {result['target']}",
+        f"Written:       {result['files_written']} files, {format_size(result['bytes_written'])} "
+        f"in {result['write_seconds']:.1f}s ({result['write_rate']:.0f} files/s)",
+        f"Encrypted:     {result['encrypted']} files, {result['files_per_second']:.0f} files/s, "
+        f"{result['mb_per_second']:.1f} MB/s",
+        f"Latency:       p50 {latency['p50']:.0f} ms, p95 {latency['p95']:.0f} ms, "
+        f"p99 {latency['p99']:.0f} ms, max {latency['max']:.0f} ms",
+        f"Outstanding:   peak {result['outstanding_peak']} files not yet encrypted"
+    ]
+    if result['backlog_peak'] is not None:
+        lines.append(
+            f"Queue:         peak {result['backlog_peak']}, mean {result['backlog_mean']:.1f}"
+        )
+    lines.append(
+        f"Peak memory:   {format_size(peak_rss) if peak_rss else 'unknown'} ({result['memory_of']})"
+    )
+    if result['unprotected']:
+        lines.append(f"⚠️  {result['unprotected']} files were still plaintext when the run ended")
+    if result['encrypted_mid_write']:
+        lines.append(f"⚠️  {result['encrypted_mid_write']} files were encrypted while still being written")
+    if result['write_errors']:
+        lines.append(f"⚠️  {result['write_errors']} writes failed")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="labyrinth_loadgen.py",
+        description="Generate file storms against a protected folder and report how protection keeps up"
+    )
+    parser.add_argument("--target", choices=TARGETS, default="engine",
+                        help="engine: in-process engine with a real observer; handlers: events "
+                             "delivered straight to a handler; folder: a folder a running "
+                             "service or dashboard already protects")
+    parser.add_argument("--folder", help="protected folder for --target folder")
+    parser.add_argument("--config", help="config.yaml of the running service (--target folder)")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=0.0, help="files per second; 0 = unthrottled")
+    parser.add_argument("--min-size", default="1KB")
+    parser.add_argument("--max-size", default="256KB")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--partial", type=float, default=0.0,
+                        help="share of files written in --chunks pieces, --chunk-delay apart")
+    parser.add_argument("--chunks", type=int, default=3)
+    parser.add_argument("--chunk-delay", type=float, default=0.2)
+    parser.add_argument("--rename", type=float, default=0.0,
+                        help="share of files written as NAME.part and then renamed")
+    parser.add_argument("--writers", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=0, help="engine worker threads; 0 = one per CPU")
+    parser.add_argument("--quiesce", type=float, default=1.0, help="engine quiet period; 0 disables coalescing")
+    parser.add_argument("--backend", choices=("thread", "process"), default="thread")
+    parser.add_argument("--cipher", default="aes-256-gcm")
+    parser.add_argument("--settle-timeout", type=float, default=120.0,
+                        help="seconds to wait for encryption to catch up after the last write")
+    parser.add_argument("--workdir", help="where scratch files go (default: system temp)")
+    parser.add_argument("--keep", action="store_true", help="leave the generated files behind")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.target == "folder" and not args.folder:
+        parser.error("--target folder needs --folder")
+    if args.folder:
+        args.target = "folder"
+
+    spec = StormSpec(
+        files=args.files,
+        rate=args.rate,
+        min_size=parse_size(args.min_size),
+        max_size=parse_size(args.max_size),
+        depth=args.depth,
+        fanout=args.fanout,
+        partial=args.partial,
+        chunks=max(args.chunks, 1),
+        chunk_delay=args.chunk_delay,
+        rename=args.rename,
+        writers=args.writers,
+        seed=args.seed
+    )
+    result = run_storm(args, spec)
+    print(json.dumps(result, indent=2) if args.json else format_report(result))
+    return 0 if result['settled'] and not result['unprotected'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,6 +11,7 @@ from tkinter import messagebox, ttk
 from pathlib import Path
 import threading
 import shutil
+import compileall
 import winreg
 
 class LabyrinthInstaller:
@@ -245,6 +246,12 @@ class LabyrinthInstaller:
                     shutil.copy2(app_file, self.install_dir / "labyrinth_enterprise.py")
                     log("✓ Copied: labyrinth_enterprise.py")
                 
+                # Copy launcher stub
+                launcher_file = script_dir / "labyrinth.pyw"
+                if launcher_file.exists():
+                    shutil.copy2(launcher_file, self.install_dir / "labyrinth.pyw")
+                    log("✓ Copied: labyrinth.pyw")
+                
                 # Copy config template
                 config_file = script_dir / "config.yaml"
                 if config_file.exists():
@@ -268,6 +275,12 @@ class LabyrinthInstaller:
                     else:
                         log(f"⚠ {package} installation warning (may already exist)")
                 
+                # Precompile so the first launch doesn't pay for compiling the app
+                status_label.config(text="Optimizing startup...")
+                log("Precompiling application...")
+                compileall.compile_dir(str(self.install_dir), quiet=1)
+                log("✓ Bytecode cached")
+                
                 # Step 4: Create Start Menu shortcut
                 if self.start_menu_var.get():
                     status_label.config(text="Creating Start Menu entry...")
@@ -318,7 +331,7 @@ class LabyrinthInstaller:
         self.start_menu_dir.mkdir(parents=True, exist_ok=True)
         
         shortcut_path = self.start_menu_dir / "Labyrinth Enterprise.lnk"
-        target = str(self.install_dir / "labyrinth_enterprise.py")
+        target = str(self.install_dir / "labyrinth.pyw")
         
         self.create_shortcut(str(shortcut_path), target)
     
@@ -326,7 +339,7 @@ class LabyrinthInstaller:
         """Create desktop shortcut"""
         desktop = Path.home() / "Desktop"
         shortcut_path = desktop / "Labyrinth Enterprise.lnk"
-        target = str(self.install_dir / "labyrinth_enterprise.py")
+        target = str(self.install_dir / "labyrinth.pyw")
         
         self.create_shortcut(str(shortcut_path), target)
     
@@ -360,7 +373,7 @@ oLink.Save
                 winreg.KEY_SET_VALUE
             )
             
-            value = f'"{sys.executable}" "{self.install_dir / "labyrinth_enterprise.py"}"'
+            value = f'"{sys.executable}" "{self.install_dir / "labyrinth.pyw"}"'
             winreg.SetValueEx(key, "LabyrinthEnterprise", 0, winreg.REG_SZ, value)
             winreg.CloseKey(key)
         except Exception as e:
@@ -448,8 +461,8 @@ if __name__ == "__main__":
             # Launch the application
             subprocess.Popen([
                 sys.executable,
-                str(self.install_dir / "labyrinth_enterprise.py")
-            ])
+                str(self.install_dir / "labyrinth.pyw")
+            ], cwd=str(self.install_dir))
         
         self.root.quit()
     